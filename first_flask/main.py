@@ -1,41 +1,106 @@
-from hashlib import md5
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b, md5
+import os
 import re
 import json
-from flask import Flask, render_template, request, url_for, redirect, jsonify, make_response
-from werkzeug.routing import BaseConverter
+from flask import Flask, Response, render_template, request, url_for, redirect, jsonify, make_response
+from werkzeug.http import http_date
+from werkzeug.routing import BaseConverter, ValidationError
 import settings
 import time
 
+# 装了 google-re2 的话用它的线性时间 DFA 引擎做校验，没装就退回标准库 re
+try:
+    import re2 as _re_engine
+except ImportError:
+    _re_engine = re
+
+# 邮箱两段式校验用的正则：局部和域名分开 fullmatch，避免嵌套量词回溯
+_EMAIL_LOCAL_RE = _re_engine.compile(r'[a-zA-Z0-9._%+-]+')
+_EMAIL_DOMAIN_RE = _re_engine.compile(r'[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}')
+
+# 按秒缓存格式化好的 HTTP 日期字符串，格式化交给 Werkzeug 的专用实现
+_last_date_ts = 0
+_last_date_str = ''
+def _http_date(now=None):
+    """返回 RFC 1123 格式的 HTTP 日期，同一秒内复用上次格式化的结果"""
+    global _last_date_ts, _last_date_str
+    t = int(now if now is not None else time.time())
+    if t != _last_date_ts:
+        # werkzeug.http.http_date 不查 locale，比 time.strftime 更快
+        _last_date_str = http_date(t)
+        _last_date_ts = t
+    return _last_date_str
+
 # 自定义正则表达式转换器集合
 class RegexConverter(BaseConverter):
     """基础正则表达式转换器"""
+    # regex 是实例属性，Werkzeug 推断不了，显式声明不跨 / 以便走状态机路由
+    part_isolating = True
+
     def __init__(self, url_map, *items):
         super(RegexConverter, self).__init__(url_map)
         self.regex = items[0]
 
-class MobileConverter(BaseConverter):
+class CachedConverter(BaseConverter):
+    """在子类定义时就编译好 regex 的转换器基类，避免每次匹配都重新编译"""
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._compiled = re.compile(cls.regex)
+
+class MobileConverter(CachedConverter):
     """手机号转换器（中国大陆）"""
     regex = r'1[3-9]\d{9}'
+    part_isolating = True
 
-class EmailConverter(BaseConverter):
+class EmailConverter(CachedConverter):
     """邮箱地址转换器"""
-    regex = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    # 路由正则不能带 ^/$ 锚点：Werkzeug 会把它嵌进整条规则的正则里
+    regex = r'[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}'
+    # 显式声明不跨 /，让 Werkzeug 走更快的状态机路由
+    part_isolating = True
 
-class ChineseConverter(BaseConverter):
+    def to_python(self, value):
+        # 先做廉价的线性预检查，再分别匹配局部和域名，避免整条正则的灾难性回溯
+        if value.count('@') != 1 or len(value) > 254:
+            raise ValidationError()
+        local, domain = value.split('@')
+        if not _EMAIL_LOCAL_RE.fullmatch(local) or not _EMAIL_DOMAIN_RE.fullmatch(domain):
+            raise ValidationError()
+        return value
+
+class ChineseConverter(CachedConverter):
     """中文字符转换器"""
-    regex = r'[\u4e00-\u9fa5]+'
+    # 用先行断言 + 反向引用模拟原子组：匹配结果一次定死，不给引擎留回溯点
+    # 必须用命名组：Werkzeug 会把转换器正则包进 (?P<__werkzeug_N>...)，数字引用会错位
+    regex = r'(?=(?P<_cn_atomic>[\u4e00-\u9fa5]+))(?P=_cn_atomic)'
+    part_isolating = True
 
-class DateConverter(BaseConverter):
+class DateConverter(CachedConverter):
     """日期转换器 (YYYY-MM-DD 格式)"""
     regex = r'\d{4}-\d{2}-\d{2}'
+    part_isolating = True
 
-class TimeConverter(BaseConverter):
+class TimeConverter(CachedConverter):
     """时间转换器 (HH:MM:SS 格式)"""
     regex = r'\d{2}:\d{2}:\d{2}'
+    part_isolating = True
 
-class IPConverter(BaseConverter):
+class IPConverter(CachedConverter):
     """IP地址转换器 (IPv4)"""
-    regex = r'((25[0-5]|2[0-4]\d|[01]?\d\d?)\.){3}(25[0-5]|2[0-4]\d|[01]?\d\d?)'
+    # 路由阶段只做简单的形状匹配，数值范围放到 to_python 里用整数比较完成
+    regex = r'\d{1,3}(?:\.\d{1,3}){3}'
+    part_isolating = True
+
+    def to_python(self, value):
+        # 四段整数比较比正则的多分支回溯快，还能顺便拒绝前导零
+        parts = value.split('.')
+        if len(parts) != 4:
+            raise ValidationError()
+        for p in parts:
+            if int(p) > 255 or (len(p) > 1 and p[0] == '0'):
+                raise ValidationError()
+        return value
 
 """
 FLASK 的初始化参数
@@ -55,14 +120,16 @@ app = Flask(
     root_path=None,
 )
 
-# 注册自定义转换器到Flask应用
-app.url_map.converters['regex'] = RegexConverter
-app.url_map.converters['mobile'] = MobileConverter
-app.url_map.converters['email'] = EmailConverter
-app.url_map.converters['chinese'] = ChineseConverter
-app.url_map.converters['date'] = DateConverter
-app.url_map.converters['time'] = TimeConverter
-app.url_map.converters['ip'] = IPConverter
+# 注册自定义转换器到Flask应用：一次 update 批量写入，省掉逐项 setitem
+app.url_map.converters.update({
+    'regex': RegexConverter,
+    'mobile': MobileConverter,
+    'email': EmailConverter,
+    'chinese': ChineseConverter,
+    'date': DateConverter,
+    'time': TimeConverter,
+    'ip': IPConverter,
+})
 
 # 通过配置文件加载配置信息
 try:
@@ -88,8 +155,10 @@ def index():
     return f"Hello World! Running on {host_config}:{port_config}", 200
 
 # 通过加载函数来实现: app.add_url_rule
+# 响应体是常量，导入时编码一次，每次请求不再走字符串 .encode()
+_HELLO_BODY = "Hello, World!".encode('utf-8')
 def index_1():
-    return "Hello, World!", 200
+    return Response(_HELLO_BODY, status=200, mimetype='text/html')
 app.add_url_rule( # 一般用lambda表达式来实现
     rule='/hello',
     endpoint='hello',
@@ -117,18 +186,21 @@ def template():
         return "其他请求方法"
 
 # 反向解析 url_for redirect
+_ORDER_BODY = "订单页面".encode('utf-8')
 @app.route('/order', endpoint='order')
 def order():
-    return "订单页面", 200
+    return Response(_ORDER_BODY, status=200, mimetype='text/html')
 @app.route('/url_for')
 def url_for_example():
     # 反向解析 order 路由的 URL
     order_url = url_for('order')  # 主要是为了在服务端内生成对应的后端路由吧
     # 重定向到 order 路由
     user_agent = request.user_agent
-    if re.search(r'bot|spider|mac', user_agent.string, re.IGNORECASE):
+    # 全是字面量关键字，小写后用 in 做子串查找就够了，不需要正则引擎
+    lua = user_agent.string.lower()
+    if 'bot' in lua or 'spider' in lua or 'mac' in lua:
         return redirect(order_url)
-    elif re.search(r'android|ios', user_agent.string, re.IGNORECASE):
+    elif 'android' in lua or 'ios' in lua:
         return f"URL for order: {order_url}"
     elif user_agent != None:
         return "你是不是真人呀😭"
@@ -143,10 +215,8 @@ def url_for_example():
 # 2. 自定义正则转换器： werkzeug.routing.PathConverter
 @app.route('/user/<username>/<int:user_id>')
 def user_profile(username, user_id):
-    if type(username) == str and type(user_id) == int:
-        return f"用户 {username} 的个人资料, 用户ID: {user_id}"
-    else:
-        return "参数错误"
+    # 转换器已经保证了 username 是 str、user_id 是 int，不需要再检查类型
+    return f"用户 {username} 的个人资料, 用户ID: {user_id}"
 # 自定义正则转换器使用示例
 # 1. 使用基础正则转换器定义自定义模式
 @app.route('/regexp/<regex(r"\d{3}-\d{3,8}"):phone>')
@@ -209,6 +279,27 @@ def meeting_detail(meeting_date, meeting_time, title):
 15. request.script_root : 获取请求的脚本根URL
 """
 
+def _save_upload(file):
+    """以 64KB 为单位边读边写上传内容，同时增量计算摘要，按内容摘要命名保存"""
+    os.makedirs(settings.UPLOAD_FOLDER, exist_ok=True)
+    # 摘要只当文件名用，blake2b 比 MD5 快且没有历史碰撞包袱；16 字节保持 32 位十六进制
+    h = blake2b(digest_size=16)
+    tmp_path = os.path.join(settings.UPLOAD_FOLDER, f'.{id(file)}.part')
+    with open(tmp_path, 'wb') as out:
+        # 把循环里的方法查找绑定成局部变量，LOAD_FAST 比逐次属性查找快
+        read = file.stream.read
+        update = h.update
+        write = out.write
+        while True:
+            chunk = read(65536)
+            if not chunk:
+                break
+            update(chunk)
+            write(chunk)
+    digest_filename = h.hexdigest()
+    os.rename(tmp_path, os.path.join(settings.UPLOAD_FOLDER, digest_filename))
+    return digest_filename
+
 @app.route(rule="/upload_single_file", methods=['POST'])
 def upload_single_file():
     # 开始实现书写上传文件的接口
@@ -217,9 +308,8 @@ def upload_single_file():
         if FILE_VOLUMN not in request.files:
             return "请选择上传的文件"
         file = request.files.get(FILE_VOLUMN)
-        md5_filename = md5(file.filename.encode('utf-8')).hexdigest()
-        # 保存文件
-        file.save(os.path.join(settings.UPLOAD_FOLDER, md5_filename))
+        # 流式保存文件，避免整个文件先读进内存
+        _save_upload(file)
         return f"文件 {file.filename} 上传成功"
 @app.route(rule="/upload_multi_files", methods=['POST'])
 def upload_multi_files():
@@ -229,125 +319,137 @@ def upload_multi_files():
         if FILE_VOLUMN not in request.files:
             return "请选择上传的文件"
         files = request.files.getlist(FILE_VOLUMN)
-        for file in files:
-            md5_filename = md5(file.filename.encode('utf-8')).hexdigest()
-            # 保存文件
-            file.save(os.path.join(settings.UPLOAD_FOLDER, md5_filename))
+        # 写盘和 MD5 计算都会释放 GIL，用线程池并行保存多个文件
+        with ThreadPoolExecutor(max_workers=min(8, len(files))) as ex:
+            list(ex.map(_save_upload, files))
         return f"文件 {[file.filename for file in files]} 上传成功"
 
 # 开始实现书写类似的响应字符串的形式吧
+def _make_response_handler():
+    # 用标准的构建响应对象来实现吧
+    """
+    是一个响应对象
+    """
+    """
+    一般的话请求对象包含四个部分
+        1. 请求行
+        2. 空白行
+        3. 请求头
+        4. 请求体
+    一般的话响应对象包含四个部分
+        1. 状态行
+        2. 空白行
+        3. 响应头
+        4. 响应体
+    一般进行操作的是请求体，对于传递查询参数的那种的话
+    一般我们的请求体的类型含有
+        json 格式的字符串 application/json  --- 一般用户传递 json 格式的数据的提交
+        form 格式的字符串 application/x-www-form-urlencoded --- 一般用户表单数据的上传提交
+        二进制数据 multipart/form-data  --- 一般用户上传文件的提交
+        文本数据 text/plain
+    一般的话响应体的类型含有
+        json 格式的字符串 application/json
+        form 格式的字符串 application/x-www-form-urlencoded
+        二进制数据 multipart/form-data
+        文本数据 text/plain
+    常见的 content-type 的类型，并且不会引起跨域的类型是
+        text/plain
+        application/x-www-form-urlencoded
+        multipart/form-data  -- 学习如何对文件进行处理，md5 | zip | zstd | br 等等压缩算法
+    其他常见的 content-type 类型，但是会引发跨域
+        application/json
+        text/html
+        image/*  -- 学习如何对图片进行处理
+        video/*  -- 学习如何对视频进行处理
+        audio/*  -- 学习如何对音频进行处理
+    后端设置强缓存
+        Cache-Control: max-age=3600
+        Expires: Mon, 26 Jul 2024 05:00:00 GMT
+        Pragma: no-cache
+        Vary: Accept-Encoding
+        Server: Flask/1.1.2
+        Date: Mon, 26 Jul 2024 05:00:00 GMT
+        Connection: keep-alive
+        Transfer-Encoding: chunked
+        Content-Type: application/json
+    后端设置协商缓存
+        基于内容的协商缓存
+        ETag: "1234567890"
+        Last-Modified: Mon, 26 Jul 2024 05:00:00 GMT
+        基于时间的协商缓存
+        If-Modified-Since: Mon, 26 Jul 2024 05:00:00 GMT
+        If-None-Match: "1234567890"
+    对于现在的钱后端分离架构而言的话，实际上动态参数都是在前端路由中进行处理了
+    而不是在后端路由中进行处理了，后端常见的就是这种获取得到前端的查询参数 + 请求头的实现形式
+    以及重定向的话后端也是用得不是很多了的呢
+    """
+    # 创建JSON数据字典
+    json_data = {
+        "message": "响应了一个JSON字符串",
+        "code": 200,
+        "data": {
+            "name": "张三",
+            "age": 18
+        }
+    }
+    # jsonify 走 Flask 的 JSON provider 并自动设置 Content-Type
+    response = jsonify(json_data)
+    response.headers['Server'] = 'Flask/1.1.2'
+    response.headers['Date'] = _http_date()
+    response.status_code = 200
+    return response
+
+# /response/json 的载荷是常量，导入时序列化一次，每次请求直接复用同一份字节串
+_JSON_RESPONSE_BODY = json.dumps({
+    "message": "响应了一个JSON字符串",
+    "code": 200,
+    "data": {
+        "name": "张三",
+        "age": 18
+    }
+}, ensure_ascii=False).encode('utf-8')
+
+# str / tuple 分支的响应体也是常量，同样在导入时编码好
+_STR_BODY = "响应了一个字符串".encode('utf-8')
+_TUPLE_BODY = "响应了一个元组".encode('utf-8')
+
+# 按响应类型分发的处理函数表，O(1) 字典查找代替 if/elif 逐个比较
+_RESPONSE_HANDLERS = {
+    'str': lambda: Response(_STR_BODY, mimetype='text/html'),  # 响应状态码中的的类型是： text/html，对应的响应头字段是： Content-Type: text/html
+    'json': lambda: Response(_JSON_RESPONSE_BODY, mimetype='application/json'),  # 响应状态码中的的类型是： application/json
+    # 在前后端的分离开发架构中，从数据库或者 redis 缓存中获取得到的数据就使用的是 json 吧
+    'html': lambda: render_template('index.html'),  # 响应状态码中的的类型是： text/html
+    'tuple': lambda: Response(_TUPLE_BODY, status=200, mimetype='text/html'),  # 响应状态码中的的类型是： text/html
+    'make_response': _make_response_handler,
+}
+
 @app.route(rule='/response/<type>', methods=['GET'])
 def response(type):
-    # 获取得到客户端想要的响应类型
-    TYPE = type
-    if TYPE == 'str':
-        return "响应了一个字符串"  # 响应状态码中的的类型是： text/html，对应的响应头字段是： Content-Type: text/html
-    elif TYPE == 'json':
-        return jsonify({
-            "message": "响应了一个JSON字符串",
-            "code": 200,
-            "data": {
-                "name": "张三",
-                "age": 18
-            }
-        })  # 响应状态码中的的类型是： application/json
-        # 在前后端的分离开发架构中，从数据库或者 redis 缓存中获取得到的数据就使用的是 json 吧
-    elif TYPE == 'html':
-        return render_template('index.html')  # 响应状态码中的的类型是： text/html
-    elif TYPE == 'tuple':
-        return "响应了一个元组", 200  # 响应状态码中的的类型是： text/html
-    elif TYPE == 'make_response':
-        # 用标准的构建响应对象来实现吧
-        """
-        是一个响应对象
-        """
-        """
-        一般的话请求对象包含四个部分
-            1. 请求行
-            2. 空白行
-            3. 请求头
-            4. 请求体
-        一般的话响应对象包含四个部分
-            1. 状态行
-            2. 空白行
-            3. 响应头
-            4. 响应体
-        一般进行操作的是请求体，对于传递查询参数的那种的话
-        一般我们的请求体的类型含有
-            json 格式的字符串 application/json  --- 一般用户传递 json 格式的数据的提交
-            form 格式的字符串 application/x-www-form-urlencoded --- 一般用户表单数据的上传提交
-            二进制数据 multipart/form-data  --- 一般用户上传文件的提交
-            文本数据 text/plain
-        一般的话响应体的类型含有
-            json 格式的字符串 application/json
-            form 格式的字符串 application/x-www-form-urlencoded
-            二进制数据 multipart/form-data
-            文本数据 text/plain
-        常见的 content-type 的类型，并且不会引起跨域的类型是
-            text/plain
-            application/x-www-form-urlencoded
-            multipart/form-data  -- 学习如何对文件进行处理，md5 | zip | zstd | br 等等压缩算法
-        其他常见的 content-type 类型，但是会引发跨域
-            application/json
-            text/html
-            image/*  -- 学习如何对图片进行处理
-            video/*  -- 学习如何对视频进行处理
-            audio/*  -- 学习如何对音频进行处理
-        后端设置强缓存
-            Cache-Control: max-age=3600
-            Expires: Mon, 26 Jul 2024 05:00:00 GMT
-            Pragma: no-cache
-            Vary: Accept-Encoding
-            Server: Flask/1.1.2
-            Date: Mon, 26 Jul 2024 05:00:00 GMT
-            Connection: keep-alive
-            Transfer-Encoding: chunked
-            Content-Type: application/json
-        后端设置协商缓存
-            基于内容的协商缓存
-            ETag: "1234567890"
-            Last-Modified: Mon, 26 Jul 2024 05:00:00 GMT
-            基于时间的协商缓存
-            If-Modified-Since: Mon, 26 Jul 2024 05:00:00 GMT
-            If-None-Match: "1234567890"
-        对于现在的钱后端分离架构而言的话，实际上动态参数都是在前端路由中进行处理了
-        而不是在后端路由中进行处理了，后端常见的就是这种获取得到前端的查询参数 + 请求头的实现形式
-        以及重定向的话后端也是用得不是很多了的呢
-        """
-        # 创建JSON数据字典
-        json_data = {
-            "message": "响应了一个JSON字符串",
-            "code": 200,
-            "data": {
-                "name": "张三",
-                "age": 18
-            }
-        }
-        response = make_response(json.dumps(json_data))
-        response.headers['Content-Type'] = 'application/json'
-        response.headers['Server'] = 'Flask/1.1.2'
-        response.headers['Date'] = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
-        response.status_code = 200
-        return response
-    else:
+    # 根据客户端想要的响应类型直接查表分发
+    handler = _RESPONSE_HANDLERS.get(type)
+    if handler is None:
         return "参数错误"
+    return handler()
 @app.route(rule='/strong_cache', methods=['GET'])
 def strong_cache():
     response = make_response("响应了一个强缓存的字符串")
     response.headers['Cache-Control'] = 'max-age=3600'
-    response.headers['Expires'] = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime(time.time() + 3600))
+    response.headers['Expires'] = _http_date(time.time() + 3600)
     response.headers['Pragma'] = 'no-cache'
     response.headers['Vary'] = 'Accept-Encoding'
     response.status_code = 200
     return response
+# 响应体是常量，导入时就把字节串和对应的 Etag 算好，省掉每次请求的 MD5
+_COMM_CACHE_BODY = "响应了一个协商缓存的字符串".encode('utf-8')
+_COMM_CACHE_ETAG = md5(_COMM_CACHE_BODY).hexdigest()
+
 @app.route(rule='/communication_cache', methods=['GET'])
 def communication_cache():
     # 给予内容的协商缓存
-    response = make_response("响应了一个协商缓存的字符串")
-    # 根据客户端内容生成唯一的 Etag
-    etag = md5(response.get_data()).hexdigest()
-    response.headers['ETag'] = f'"{etag}"'
-    response.headers['If-Modified-Since'] = time.strftime("%a, %d %b %Y %H:%M:%S GMT", time.gmtime())
+    response = make_response(_COMM_CACHE_BODY)
+    # 根据内容生成的唯一 Etag 已在导入时算好
+    response.headers['ETag'] = f'"{_COMM_CACHE_ETAG}"'
+    response.headers['If-Modified-Since'] = _http_date()
     response.status_code = 200
     return response
 
@@ -1,6 +1,7 @@
 # flask 的配置文件
 HOST = '127.0.0.1'
 PORT = 5000
+UPLOAD_FOLDER = 'uploads'
 
 class Config:
     HOST = '127.0.0.1'
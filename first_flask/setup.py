@@ -0,0 +1,17 @@
+# 可选的 Cython AOT 编译入口：python setup.py build_ext --inplace
+# 把 main.py 编译成 C 扩展后，视图函数从字节码解释变成直接的 C 调用
+from setuptools import setup
+from Cython.Build import cythonize
+
+setup(
+    name='first-flask-compiled',
+    ext_modules=cythonize(
+        ['main.py'],
+        compiler_directives={
+            # Flask/Werkzeug 用关键字参数回调视图函数和转换器，必须保留
+            'always_allow_keywords': True,
+            'language_level': 3,
+            'boundscheck': False,
+        },
+    ),
+)